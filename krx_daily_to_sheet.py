@@ -2,33 +2,174 @@
 # 기능: 종목별 시트에 날짜별 OHLCV(시가, 고가, 저가, 종가, 거래량, 등락률)만 누적 기록
 # - 종목별 워크시트 자동 생성 (제목: "종목코드 종목명")
 # - 헤더: ["날짜","종목코드","종목명","시가","고가","저가","종가","거래량","등락률"]
+# - 시세는 KRX 원시 가격(수정주가 아님) 기준. 일괄 조회·종목별 조회 모두 같은 원천 사용
 # - 같은 날짜는 한 번만 기록(중복 방지)
+# - 종목별 시세 조회는 스레드풀로 병렬 수행, 시트 기록은 단일 스레드
 # - 예외 발생 시에도 액션이 깨지지 않도록 항상 exit 0
 
-from datetime import datetime, timedelta
-import os, json, re, sys, traceback
-from typing import Optional, Dict, Any, List
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeout
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+import os, json, shutil, sys, traceback
+from typing import Optional, Dict, Any, FrozenSet, List, Tuple
 
-import pandas as pd
+import requests
+from tenacity import retry, retry_if_exception_type, retry_if_result, stop_after_attempt, wait_exponential
 from pykrx import stock
 import gspread
-from oauth2client.service_account import ServiceAccountCredentials
+from google.auth.transport.requests import Request
+from google.oauth2.service_account import Credentials
+try:
+    from orjson import loads as _json_loads   # C 구현 JSON 파서 (서비스 계정 JSON 파싱용)
+except ImportError:                           # 미설치 환경에서는 표준 json 사용
+    _json_loads = json.loads
 
 # ---------- 환경변수 ----------
+def _env_num(name: str, default, conv):
+    """숫자 환경변수. 형식이 잘못되면 경고 후 기본값 (import 시점 예외로 exit 0 계약이 깨지지 않도록)"""
+    raw = os.environ.get(name)
+    if not raw:
+        return default
+    try:
+        return conv(raw)
+    except ValueError:
+        print(f"[WARN] {name}={raw!r} 형식 오류 → 기본값 {default} 사용")
+        return default
+
 SERVICE_ACCOUNT_JSON = os.environ.get("GOOGLE_SERVICE_ACCOUNT_JSON")      # 서비스 계정 JSON(문자열)
 SPREADSHEET_ID      = os.environ.get("SPREADSHEET_ID")                    # 필수
 TICKERS             = [t.strip() for t in os.environ.get("TICKERS", "082270,358570,000250").split(",") if t.strip()]
 RUN_DATE            = os.environ.get("RUN_DATE")  # 예: "2025-09-29" (테스트용)
+KRX_WORKERS         = _env_num("KRX_WORKERS", 8, int)                     # pykrx 동시 조회 스레드 수
+# 시세 수집 단계에서 결과를 기다리는 한도(초). 응답 없는 조회 스레드를 끊지는 못하므로
+# 프로세스 종료는 그 스레드가 끝날 때까지 늦어질 수 있음
+KRX_TIMEOUT         = _env_num("KRX_TIMEOUT", 120.0, float)
+CACHE_DIR           = os.environ.get("KRX_CACHE_DIR", ".cache")           # 종목명 등 로컬 캐시 위치
+# 액세스 토큰 캐시 파일 (빈 값이면 사용 안 함). 비밀값이므로 CACHE_DIR(Actions 캐시로 공유)과 분리
+TOKEN_CACHE_PATH    = os.environ.get("KRX_TOKEN_CACHE", "/tmp/krx_token.json")
 
 # ---------- 공용 ----------
+SCOPES = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
+
+def _service_account_creds(info: Dict[str, Any]) -> Credentials:
+    """서비스 계정 자격증명. 캐시된 토큰이 60초 이상 남아 있으면 JWT 서명/교환 생략"""
+    creds = Credentials.from_service_account_info(info, scopes=SCOPES)
+    now = datetime.now(timezone.utc).replace(tzinfo=None)  # google-auth는 naive UTC 사용
+    cached = _load_json(TOKEN_CACHE_PATH, {}) if TOKEN_CACHE_PATH else {}
+    if cached.get("client_email") == info.get("client_email") and cached.get("token"):
+        try:
+            expiry = datetime.strptime(cached["expiry"], "%Y-%m-%dT%H:%M:%S")
+        except (KeyError, ValueError):
+            expiry = now
+        if expiry - now > timedelta(seconds=60):
+            creds.token, creds.expiry = cached["token"], expiry
+            return creds
+
+    creds.refresh(Request())
+    if not TOKEN_CACHE_PATH:
+        return creds
+    _save_json(TOKEN_CACHE_PATH, {
+        "client_email": info.get("client_email"),
+        "token": creds.token,
+        "expiry": creds.expiry.strftime("%Y-%m-%dT%H:%M:%S"),
+    }, mode=0o600)
+    return creds
+
 def authorize_from_json_str(json_str: str):
-    scopes = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
-    info = json.loads(json_str)
-    creds = ServiceAccountCredentials.from_json_keyfile_dict(info, scopes)
-    return gspread.authorize(creds)
+    info = _json_loads(json_str)
+    return gspread.authorize(_service_account_creds(info))
+
+def _pool_size(n_jobs: int) -> int:
+    """KRX 동시 요청 수: KRX_WORKERS 상한, 작업 수보다 많은 스레드는 만들지 않음 (최소 1)"""
+    return max(1, min(KRX_WORKERS, n_jobs))
+
+# pykrx가 밖으로 내보내는 일시 장애는 연결 오류뿐 (timeout 미지정·raise_for_status 미호출).
+# 구조적 오류(KeyError 등)는 그대로 전파
+_KRX_TRANSIENT = (requests.ConnectionError, ConnectionError)
+
+@retry(
+    retry=retry_if_exception_type(_KRX_TRANSIENT),
+    stop=stop_after_attempt(3),
+    wait=wait_exponential(multiplier=1, max=8),
+    reraise=True,
+)
+def _krx_call(fn, *args, **kwargs):
+    """pykrx 조회 공통 래퍼 (재시도 포함)"""
+    return fn(*args, **kwargs)
+
+def _empty_frame(df) -> bool:
+    return df is None or df.empty
+
+# KRX 5xx·HTML 오류 응답은 pykrx가 빈 DataFrame으로 바꾸므로, 비어 있을 수 없는 조회는 빈 결과도 재시도.
+# 끝까지 비면 마지막 결과(빈 프레임)를 그대로 반환
+@retry(
+    retry=retry_if_exception_type(_KRX_TRANSIENT) | retry_if_result(_empty_frame),
+    stop=stop_after_attempt(3),
+    wait=wait_exponential(multiplier=1, max=8),
+    retry_error_callback=lambda state: state.outcome.result(),
+)
+def _krx_call_nonempty(fn, *args, **kwargs):
+    """결과가 반드시 있어야 하는 pykrx 조회(지수 구간·전 종목 일괄) 래퍼"""
+    return fn(*args, **kwargs)
+
+def _load_json(path: str, default: Any) -> Any:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+def _save_json(path: str, data: Any, mode: int = 0o644) -> None:
+    """임시 파일에 쓴 뒤 os.replace로 교체(원자적 저장). 캐시이므로 실패해도 무시"""
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.tmp"
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        with os.fdopen(os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, mode), "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp, path)
+    except OSError:
+        traceback.print_exc()
+
+TRADING_DAYS_CACHE_PATH = os.path.join(CACHE_DIR, "trading_days.json")
+
+def _save_trading_days(cache: Dict[str, Any], start: str, through: str, days: set) -> None:
+    """확인 구간 [start, through]의 거래일을 캐시에 반영. 기존 구간과 겹치면 합치고, 떨어져 있으면 교체"""
+    lo, hi = cache.get("from", ""), cache.get("through", "")
+    if lo and start <= hi and lo <= through:
+        start, through = min(lo, start), max(hi, through)
+        days = days | set(cache.get("days", []))
+    _save_json(TRADING_DAYS_CACHE_PATH, {"from": start, "through": through, "days": sorted(days)})
 
 def get_recent_trading_day(base_date: datetime) -> datetime:
-    """기준일 기준 가장 가까운 거래일(과거)을 찾기 (주말/휴일 보정)"""
+    """기준일 기준 가장 가까운 거래일(과거)을 찾기 (주말/휴일 보정)
+    확인된 거래일 달력은 로컬 캐시에 보관해, 기준일이 확인 구간 안이면 조회 없이 반환.
+    캐시에 없으면 최근 30일 KOSPI 지수를 한 번에 조회해 마지막 거래일을 사용, 실패 시에만 하루씩 역순 확인"""
+    base = base_date.strftime("%Y%m%d")
+    cache = _load_json(TRADING_DAYS_CACHE_PATH, {})
+    lo, hi = cache.get("from", ""), cache.get("through", "")
+    if lo and lo <= base <= hi:
+        known = [d for d in cache.get("days", []) if lo <= d <= base]
+        if known:
+            return datetime.strptime(max(known), "%Y%m%d")
+
+    start = (base_date - timedelta(days=30)).strftime("%Y%m%d")
+    try:
+        df = _krx_call_nonempty(stock.get_index_ohlcv_by_date, start, base, "1001")
+        if df is not None and not df.empty:
+            days = set(df.index.strftime("%Y%m%d"))
+            now = datetime.now()
+            # 오늘 지수가 아직 없으면(장 마감 전) 오늘은 확인 구간에서 제외
+            through = base if base < now.strftime("%Y%m%d") or base in days \
+                else (now - timedelta(days=1)).strftime("%Y%m%d")
+            if start <= through:
+                _save_trading_days(cache, start, through, days)
+            return df.index.max().to_pydatetime()
+    except Exception:
+        traceback.print_exc()
+
+    # 최후 수단: 하루씩 확인. 범위 조회에서 이미 재시도했으므로 여기서는 재시도 없이 1회씩만 호출
     d = base_date
     for _ in range(20):
         s = d.strftime("%Y%m%d")
@@ -42,61 +183,148 @@ def get_recent_trading_day(base_date: datetime) -> datetime:
     return d
 
 # ---------- 컬럼 매칭(견고) ----------
+# 공백·괄호·기호·'원'·숫자(전각 포함)를 한 번에 삭제하는 변환 테이블
+_NORM_TABLE = str.maketrans("", "", " ()[]{}％%원,.-_/" + "0123456789" + "０１２３４５６７８９")
+
+@lru_cache(maxsize=1024)
 def _norm(s: str) -> str:
     if s is None: return ""
-    s = str(s)
-    s = s.replace(" ", "")
-    s = re.sub(r"[\(\)\[\]{}％%원,.\-_/]", "", s)
-    s = re.sub(r"\d+", "", s)
-    return s
-
-def pick_col(df: pd.DataFrame, candidates: List[str]) -> Optional[str]:
-    if df is None or df.empty: return None
-    norm_map = {_norm(c): c for c in df.columns}
-    # 1) 정확히 일치
-    for c in candidates:
-        if c in df.columns: return c
-    # 2) 정규화 후 일치
-    for c in candidates:
-        nc = _norm(c)
-        if nc in norm_map: return norm_map[nc]
-    # 3) 부분 포함
-    for c in candidates:
-        nc = _norm(c)
-        for k, orig in norm_map.items():
-            if nc and nc in k: return orig
-    return None
+    return str(s).translate(_NORM_TABLE)
+
+ColMap = Tuple[FrozenSet[str], Dict[str, str]]
+
+@lru_cache(maxsize=32)
+def build_colmap(cols: Tuple[str, ...]) -> ColMap:
+    """컬럼 구성(스키마)별 (원래 컬럼명 집합, {정규화명: 원래 컬럼명}). 같은 스키마는 한 번만 계산"""
+    return frozenset(cols), {_norm(c): c for c in cols}
+
+def pick_cols(colmap: ColMap, spec: Dict[str, List[Tuple[str, str]]]) -> Dict[str, Optional[str]]:
+    """필수 컬럼 여러 개를 한 번에 매칭 (정확히 일치 > 정규화 후 일치 > 부분 포함)
+
+    >>> pick_cols(build_colmap(("등락률", "등락률(%)")), {"등락률": [("등락률", "등락률")]})
+    {'등락률': '등락률'}
+    """
+    names, norm_map = colmap
+    out: Dict[str, Optional[str]] = {k: None for k in spec}
+    best: Dict[str, Tuple[int, int, int]] = {}
+    for key, normed in spec.items():
+        i = next((i for i, (c, _) in enumerate(normed) if c in names), None)
+        if i is not None:
+            best[key] = (0, i, 0)
+            out[key] = normed[i][0]
+    for j, (k, orig) in enumerate(norm_map.items()):
+        for key, normed in spec.items():
+            for i, (c, nc) in enumerate(normed):
+                if nc and nc == k:        rank = (1, i, j)
+                elif nc and nc in k:      rank = (2, i, j)
+                else: continue
+                if key not in best or rank < best[key]:
+                    best[key] = rank
+                    out[key] = orig
+    return out
+
+# OHLCV 필수 컬럼별 후보 (등락'율' 오타 대응). 후보는 고정이므로 정규화 결과를 미리 계산
+OHLCV_CANDIDATES: Dict[str, List[str]] = {
+    "시가": ["시가"],
+    "고가": ["고가"],
+    "저가": ["저가"],
+    "종가": ["종가"],
+    "거래량": ["거래량"],
+    "등락률": ["등락률", "등락률(%)", "등락율"],
+}
+_OHLCV_NORMED = {k: [(c, _norm(c)) for c in v] for k, v in OHLCV_CANDIDATES.items()}
+
+@lru_cache(maxsize=32)
+def _ohlcv_cols(cols: Tuple[str, ...]) -> Dict[str, Optional[str]]:
+    """스키마별 OHLCV 컬럼 매칭 결과. 모든 종목이 같은 스키마라 실행당 한 번만 계산 (반환값 수정 금지)"""
+    return pick_cols(build_colmap(cols), _OHLCV_NORMED)
 
 # ---------- 데이터 수집 ----------
-def fetch_daily_for_ticker(date_str: str, ticker: str) -> Optional[Dict[str, Any]]:
-    """OHLCV 6개 컬럼만 반환. 없으면 None."""
-    ohlcv = stock.get_market_ohlcv_by_date(date_str, date_str, ticker)
-    if ohlcv is None or ohlcv.empty:
-        print(f"[INFO] {ticker}: 해당 날짜({date_str}) 시세 없음")
-        return None
+def _ticker_name(ticker: str) -> str:
+    try:
+        return _krx_call(stock.get_market_ticker_name, ticker) or ""
+    except Exception:
+        return ""
 
-    # 견고한 컬럼 탐색
-    open_col   = pick_col(ohlcv, ["시가"])
-    high_col   = pick_col(ohlcv, ["고가"])
-    low_col    = pick_col(ohlcv, ["저가"])
-    close_col  = pick_col(ohlcv, ["종가"])
-    volume_col = pick_col(ohlcv, ["거래량"])
-    change_col = pick_col(ohlcv, ["등락률", "등락률(%)", "등락율"])  # 등락'율' 오타 대응
-
-    needed = [("시가", open_col), ("고가", high_col), ("저가", low_col),
-              ("종가", close_col), ("거래량", volume_col), ("등락률", change_col)]
-    miss = [n for n, c in needed if c is None]
-    if miss:
-        print(f"[WARN] {ticker}: 필수 컬럼 누락 {miss} | 보유={list(ohlcv.columns)}")
-        return None
+NAME_CACHE_PATH = os.path.join(CACHE_DIR, "ticker_names.json")
 
-    row = ohlcv.iloc[0]
+def load_ticker_names(tickers: List[str]) -> Dict[str, str]:
+    """종목명은 거의 바뀌지 않으므로 로컬 캐시 사용. 캐시에 없는 종목만 조회 후 저장"""
+    names: Dict[str, str] = _load_json(NAME_CACHE_PATH, {})
+    missing = [t for t in tickers if not names.get(t)]
+    if missing:
+        # 순차 조회: pykrx 종목명 조회는 첫 호출에 전체 종목표를 받아 메모리에 두는 싱글턴이라
+        # 이후 호출은 네트워크 없이 끝남 (병렬이면 스레드마다 종목표를 다시 받음)
+        for t in missing:
+            name = _ticker_name(t)
+            if name:
+                names[t] = name
+        _save_json(NAME_CACHE_PATH, names)
+    return names
 
-    # 종목명
+# 지난 거래일 시세는 바뀌지 않으므로 종목별로 보관: {CACHE_DIR}/krx/{YYYYMMDD}/{종목코드}.json
+DAILY_CACHE_DIR = os.path.join(CACHE_DIR, "krx")
+DAILY_CACHE_DAYS = 14   # 이보다 오래된 날짜 폴더는 삭제 (Actions 캐시가 계속 커지지 않도록)
+
+def _daily_cache_path(date_str: str, ticker: str) -> str:
+    return os.path.join(DAILY_CACHE_DIR, date_str, f"{ticker}.json")
+
+def prune_daily_cache() -> None:
+    """보관 기간(DAILY_CACHE_DAYS)이 지난 날짜별 시세 캐시 폴더 삭제"""
+    cutoff = (datetime.now() - timedelta(days=DAILY_CACHE_DAYS)).strftime("%Y%m%d")
+    try:
+        entries = os.listdir(DAILY_CACHE_DIR)
+    except OSError:
+        return
+    for d in entries:
+        if len(d) == 8 and d.isdigit() and d < cutoff:
+            shutil.rmtree(os.path.join(DAILY_CACHE_DIR, d), ignore_errors=True)
+
+def _daily_cacheable(date_str: str) -> bool:
+    """오늘 시세는 장중·마감 직후 바뀔 수 있으므로 지난 날짜만 캐시"""
+    return date_str < datetime.now().strftime("%Y%m%d")
+
+def fetch_market_ohlcv(date_str: str, tickers: List[str]) -> Optional[Dict[str, Dict[str, Any]]]:
+    """해당 날짜 전 시장(KOSPI·KOSDAQ·KONEX) 종목 OHLCV를 1회 호출로 조회. 실패 시 None
+    대상 종목 행만 골라 {종목코드: {컬럼: 값}}으로 변환 (전 종목 변환은 수천 행이라 생략)"""
     try:
-        ticker_name = stock.get_market_ticker_name(ticker) or ""
+        df = _krx_call_nonempty(stock.get_market_ohlcv_by_ticker, date_str, market="ALL")
     except Exception:
-        ticker_name = ""
+        traceback.print_exc()
+        return None
+    if df is None or df.empty:
+        return None
+    df = df[df.index.isin(tickers)]
+    return df[~df.index.duplicated()].to_dict("index")
+
+def fetch_daily_for_ticker(date_str: str, ticker: str,
+                           market: Optional[Dict[str, Dict[str, Any]]],
+                           ticker_name: str,
+                           iso_date: str) -> Optional[Tuple[Any, ...]]:
+    """KR_HEADER 순서의 행(tuple)을 반환. 없으면 None.
+    일괄 조회(market)에 없는 종목만 개별 조회. 지난 날짜는 로컬 캐시 우선"""
+    cacheable = _daily_cacheable(date_str)
+    if cacheable:
+        # 캐시에는 종목명을 빼고 저장 → 읽을 때 현재 종목명으로 채움
+        cached = _load_json(_daily_cache_path(date_str, ticker), None)
+        if isinstance(cached, list) and len(cached) == len(KR_HEADER) - 1:
+            return (*cached[:2], ticker_name, *cached[2:])
+
+    row: Optional[Dict[str, Any]] = market.get(ticker) if market is not None else None
+    if row is None:
+        # 일괄 조회와 같은 KRX 원천(수정주가 아님)으로 맞춤. 기본값 adjusted=True는 네이버 수정주가
+        ohlcv = _krx_call(stock.get_market_ohlcv_by_date, date_str, date_str, ticker, adjusted=False)
+        if ohlcv is None or ohlcv.empty:
+            print(f"[INFO] {ticker}: 해당 날짜({date_str}) 시세 없음")
+            return None
+        row = ohlcv.iloc[0].to_dict()  # 1행만 필요하므로 즉시 dict로 변환
+
+    # 견고한 컬럼 탐색 (필수 컬럼 전체를 한 번에)
+    cols = _ohlcv_cols(tuple(row))
+    miss = [n for n, c in cols.items() if c is None]
+    if miss:
+        print(f"[WARN] {ticker}: 필수 컬럼 누락 {miss} | 보유={list(row)}")
+        return None
 
     # 값 파싱
     def to_int(x):
@@ -107,53 +335,204 @@ def fetch_daily_for_ticker(date_str: str, ticker: str) -> Optional[Dict[str, Any
         try: return float(x)
         except Exception: return None
 
-    change_val = to_float(row[change_col])
+    change_val = to_float(row[cols["등락률"]])
     if change_val is not None:
         change_val = round(change_val, 2)  # ✅ 소수 둘째 자리까지 반올림
     
-    rec: Dict[str, Any] = {
-        "날짜": datetime.strptime(date_str, "%Y%m%d").strftime("%Y-%m-%d"),
-        "종목코드": ticker,
-        "종목명": ticker_name,
-        "시가": to_int(row[open_col]),
-        "고가": to_int(row[high_col]),
-        "저가": to_int(row[low_col]),
-        "종가": to_int(row[close_col]),
-        "거래량": to_int(row[volume_col]),
-        "등락률": change_val,
-    }
-
+    # KR_HEADER 순서 그대로 → 시트 기록 시 별도 변환 없이 사용
+    rec = (
+        iso_date,                       # 날짜(YYYY-MM-DD)
+        ticker,                         # 종목코드
+        ticker_name,                    # 종목명
+        to_int(row[cols["시가"]]),
+        to_int(row[cols["고가"]]),
+        to_int(row[cols["저가"]]),
+        to_int(row[cols["종가"]]),
+        to_int(row[cols["거래량"]]),
+        change_val,                     # 등락률
+    )
+    if cacheable:
+        _save_json(_daily_cache_path(date_str, ticker), rec[:2] + rec[3:])
     return rec
 
 # ---------- 시트 기록 (종목별 시트) ----------
-KR_HEADER = [
+KR_HEADER = (
     "날짜","종목코드","종목명",
     "시가","고가","저가","종가","거래량","등락률",
-]
+)
 
-def ensure_ticker_sheet(sh, ticker: str, name: str, header: List[str]):
-    """종목별 워크시트를 (없으면) 생성하고 헤더 정렬."""
-    title = f"{ticker} {name}".strip() if name else f"{ticker}"
-    try:
-        ws = sh.worksheet(title)
-    except gspread.exceptions.WorksheetNotFound:
-        ws = sh.add_worksheet(title=title, rows="2000", cols=str(len(header)))
-        ws.append_row(header)
-    first = ws.row_values(1)
-    if first != header:
-        if first:
-            ws.delete_rows(1)
-        ws.insert_row(header, 1)
-    return ws
-
-def existing_dates(ws) -> set:
-    """종목별 시트는 날짜만 중복 방지 키로 사용"""
-    keys = set()
-    data = ws.get_all_values()
-    for row in data[1:]:
-        if len(row) >= 1 and row[0]:
-            keys.add(row[0])
-    return keys
+def sheet_title(ticker: str, name: str) -> str:
+    """종목별 워크시트 제목: "종목코드 종목명" """
+    return f"{ticker} {name}".strip() if name else f"{ticker}"
+
+def _a1(title: str) -> str:
+    """A1 표기용 시트 제목 인용 ('는 ''로 이스케이프)"""
+    return "'" + title.replace("'", "''") + "'"
+
+# 시트별 마지막 기록일을 developerMetadata로 보관 → 평소에는 중복 확인용 조회 생략
+META_LAST_DATE = "krx_last_date"
+
+def load_sheet_index(sh) -> Dict[str, Dict[str, Any]]:
+    """스프레드시트 메타데이터 1회 조회로 시트별 정보 구성.
+    {제목: {"id": sheetId, "rows": 그리드 행 수, "last": 마지막 기록일 developerMetadata 또는 None}}"""
+    meta = sh.fetch_sheet_metadata(params={
+        "fields": "sheets(properties(sheetId,title,gridProperties(rowCount)),"
+                  "developerMetadata(metadataId,metadataKey,metadataValue))",
+    })
+    index: Dict[str, Dict[str, Any]] = {}
+    for sheet in meta.get("sheets", []):
+        props = sheet["properties"]
+        last = next((m for m in sheet.get("developerMetadata", [])
+                     if m.get("metadataKey") == META_LAST_DATE), None)
+        index[props["title"]] = {
+            "id": props["sheetId"],
+            "rows": props.get("gridProperties", {}).get("rowCount", 0),
+            "last": last,
+        }
+    return index
+
+def existing_dates(column: List[Any]) -> set:
+    """종목별 시트는 날짜만 중복 방지 키로 사용 (A2:A 열 값 목록에서 날짜 집합 구성)"""
+    return {v for v in column if v}
+
+def read_ticker_sheets(sh, titles: List[str], header: Tuple[str, ...], index: Dict[str, Dict[str, Any]],
+                       date_titles: List[str] = ()) -> Dict[str, set]:
+    """기존 시트의 헤더와 A열(date_titles)을 한 번에 조회해 {제목: 기존 날짜 집합} 반환 (index 갱신)"""
+    existing = [t for t in titles if t in index]
+    date_titles = [t for t in date_titles if t in index]
+    seen: Dict[str, set] = {}
+    if not existing and not date_titles:
+        return seen
+    # 열 단위(COLUMNS)로 받으면 A열이 [[v1, v2, ...]] 한 줄이 되어 행마다 감싸는 배열이 없어짐
+    resp = sh.values_batch_get([f"{_a1(t)}!1:1" for t in existing] +
+                               [f"{_a1(t)}!A2:A" for t in date_titles],
+                               params={"majorDimension": "COLUMNS"})
+    vrs = resp.get("valueRanges", [])
+    for t, vr in zip(existing, vrs[:len(existing)]):
+        first = [col[0] if col else "" for col in vr.get("values", [])]
+        if first != list(header):
+            # 기존 1행을 헤더로 덮어쓰기 (헤더보다 긴 부분은 빈 값으로 지움)
+            index[t]["header_fix"] = list(header) + [""] * (len(first) - len(header))
+    for t, vr in zip(date_titles, vrs[len(existing):]):
+        column = (vr.get("values") or [[]])[0]
+        seen[t] = existing_dates(column)
+        index[t]["next_row"] = 1 + len(column)  # 헤더 1행 + 데이터 행
+    return seen
+
+def ensure_sheet_requests(titles: List[str], header: Tuple[str, ...],
+                          index: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """없는 시트 생성·헤더 정렬 요청 목록 (새 시트 sheetId는 직접 지정, index 갱신)"""
+    reqs: List[Dict[str, Any]] = []
+    used = {info["id"] for info in index.values()}
+    new_id = 0
+    for t in titles:
+        if t in index:
+            continue
+        while new_id in used:
+            new_id += 1
+        used.add(new_id)
+        reqs.append({"addSheet": {"properties": {
+            "sheetId": new_id,
+            "title": t,
+            "gridProperties": {"rowCount": 2000, "columnCount": len(header)},
+        }}})
+        index[t] = {"id": new_id, "rows": 2000, "last": None,
+                    "next_row": 1,  # 헤더 다음 행(0-based)
+                    "header_fix": list(header)}
+
+    for t in titles:
+        row = index[t].pop("header_fix", None)
+        if row is not None:
+            # 1행 덮어쓰기 (빈 값 셀은 지워짐 → 헤더보다 긴 기존 값 정리)
+            reqs.append({"updateCells": {
+                "start": {"sheetId": index[t]["id"], "rowIndex": 0, "columnIndex": 0},
+                "rows": [{"values": [_cell(v) for v in row]}],
+                "fields": "userEnteredValue",
+            }})
+    return reqs
+
+def last_date_requests(pending: Dict[str, Any], index: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """새로 기록한 행 기준으로 마지막 기록일 메타데이터 생성/갱신 요청 목록"""
+    reqs = []
+    for title, rows in pending.items():
+        if not rows:
+            continue
+        sheet_id = index[title]["id"]
+        newest = max(row[0] for row in rows)  # row[0] = 날짜(YYYY-MM-DD)
+        m = index[title]["last"]
+        if m is None:
+            reqs.append({"createDeveloperMetadata": {"developerMetadata": {
+                "metadataKey": META_LAST_DATE,
+                "metadataValue": newest,
+                "location": {"sheetId": sheet_id},
+                "visibility": "DOCUMENT",
+            }}})
+        elif newest > m.get("metadataValue", ""):
+            reqs.append({"updateDeveloperMetadata": {
+                "dataFilters": [{"developerMetadataLookup": {"metadataId": m["metadataId"]}}],
+                "developerMetadata": {"metadataValue": newest},
+                "fields": "metadataValue",
+            }})
+    return reqs
+
+def _cell(v: Any) -> Dict[str, Any]:
+    """값을 RAW 입력과 같은 의미의 CellData로 변환 (None/"" → 빈 셀)"""
+    if v is None or v == "":
+        return {}
+    if isinstance(v, bool):
+        return {"userEnteredValue": {"boolValue": v}}
+    if isinstance(v, (int, float)):
+        return {"userEnteredValue": {"numberValue": v}}
+    return {"userEnteredValue": {"stringValue": str(v)}}
+
+def write_rows_batch(sh, pending: Dict[str, Any], index: Dict[str, Dict[str, Any]],
+                     setup: Optional[List[Dict[str, Any]]] = None,
+                     extra: Optional[List[Dict[str, Any]]] = None) -> None:
+    """시트별 신규 행(pending)을 setup·extra 요청과 함께 batchUpdate 1회로 기록"""
+    reqs = []
+    for title, rows in pending.items():
+        if not rows:
+            continue
+        cells = [{"values": [_cell(v) for v in row]} for row in rows]
+        info = index[title]
+        sheet_id = info["id"]
+        next_row = info.get("next_row")
+        if next_row is None:
+            reqs.append({"appendCells": {"sheetId": sheet_id, "rows": cells, "fields": "userEnteredValue"}})
+            continue
+        short = next_row + len(rows) - info["rows"]
+        if short > 0:
+            reqs.append({"appendDimension": {"sheetId": sheet_id, "dimension": "ROWS", "length": short}})
+            info["rows"] += short
+        reqs.append({"updateCells": {
+            "start": {"sheetId": sheet_id, "rowIndex": next_row, "columnIndex": 0},
+            "rows": cells,
+            "fields": "userEnteredValue",
+        }})
+        info["next_row"] = next_row + len(rows)
+    if reqs:
+        sh.batch_update({"requests": (setup or []) + reqs + (extra or [])})
+
+def open_ticker_sheets(key: str, titles: Dict[str, str]) -> Tuple[Any, Dict[str, Dict[str, Any]], Dict[str, set]]:
+    """
+    인증 → 스프레드시트 열기 → 시트 목록·헤더·기존 날짜 조회를 차례로 수행.
+    KRX 시세 수집과 겹쳐 실행되도록 main 에서 별도 스레드로 호출.
+    반환: (sh, index, {시트제목: 기존 날짜 집합})
+    """
+    gc = authorize_from_json_str(SERVICE_ACCOUNT_JSON)
+    sh = gc.open_by_key(SPREADSHEET_ID)
+    index = load_sheet_index(sh)
+
+    # 메타데이터와 같거나 새 날짜면 시트 조회 없이 판단.
+    # 메타데이터가 없거나(최초) 과거 날짜(백필)인 기존 시트만 A열을 헤더와 함께 한 번에 조회
+    def stale(title: str) -> bool:
+        last = ((index.get(title) or {}).get("last") or {}).get("metadataValue", "")
+        return not (last and key >= last)
+
+    to_read = [title for title in titles.values() if stale(title)]
+    seen_by_title = read_ticker_sheets(sh, list(dict.fromkeys(titles.values())), KR_HEADER, index,
+                                       list(dict.fromkeys(to_read)))
+    return sh, index, seen_by_title
 
 def main() -> int:
     try:
@@ -165,34 +544,66 @@ def main() -> int:
         trade_day = get_recent_trading_day(base)
         date_str = trade_day.strftime("%Y%m%d")
 
-        gc = authorize_from_json_str(SERVICE_ACCOUNT_JSON)
-        sh = gc.open_by_key(SPREADSHEET_ID)
-
-        appended_total = 0
-        for t in TICKERS:
-            try:
-                rec = fetch_daily_for_ticker(date_str, t)
-            except Exception as e:
-                traceback.print_exc()
-                rec = None
-            if not rec:
-                continue
-
-            ws = ensure_ticker_sheet(sh, t, rec.get("종목명", ""), KR_HEADER)
-            seen = existing_dates(ws)
-            key = rec["날짜"]
-            if key in seen:
-                print(f"Skip duplicate: {t} {rec.get('종목명','')} @ {key}")
-                continue
-
-            row = [rec.get(h, "") for h in KR_HEADER]
-            ws.append_row(row, value_input_option="RAW")
-            appended_total += 1
+        # 1) 시트 사전 조회: 대상 거래일은 모든 종목이 같으므로 시세와 별개로 중복 여부를 파악
+        key = trade_day.strftime("%Y-%m-%d")
+        names = load_ticker_names(TICKERS)
+        titles = {t: sheet_title(t, names.get(t, "")) for t in TICKERS}
+
+        # Sheets 인증·열기·조회는 KRX 시세 수집과 무관하므로 별도 스레드에서 동시에 진행
+        sheets_ex = ThreadPoolExecutor(max_workers=1)
+        sheets_fut = sheets_ex.submit(open_ticker_sheets, key, titles)
+        sheets_ex.shutdown(wait=False)
+
+        # 2) 시세 수집: 전 종목 일괄 조회 후, 종목별 처리(누락 종목은 개별 조회)를 병렬 실행.
+        #    완료되는 대로 바로 중복 확인 후 행으로 변환 (기록은 단일 스레드에서 일괄)
+        #    지난 거래일 시세가 모든 종목 캐시에 있으면 일괄 조회도 생략
+        prune_daily_cache()
+        all_cached = _daily_cacheable(date_str) and \
+            all(os.path.exists(_daily_cache_path(date_str, t)) for t in TICKERS)
+        market = None if all_cached else fetch_market_ohlcv(date_str, TICKERS)
+        pending: Dict[str, List[Any]] = {}   # {시트제목: [row, ...]}
+        ex = ThreadPoolExecutor(max_workers=_pool_size(len(TICKERS)))
+        futures = {ex.submit(fetch_daily_for_ticker, date_str, t, market, names.get(t, ""), key): t for t in TICKERS}
+
+        def last_of(title: str) -> str:
+            return ((index.get(title) or {}).get("last") or {}).get("metadataValue", "")
+
+        try:
+            # 중복 확인 전에 시트 조회 결과를 기다림 (실패 시 바깥 except 로 전파)
+            sh, index, seen_by_title = sheets_fut.result()
+            for fut in as_completed(futures, timeout=KRX_TIMEOUT):
+                t = futures[fut]
+                try:
+                    rec = fut.result()
+                except Exception:
+                    traceback.print_exc()
+                    rec = None
+                if not rec:
+                    continue
+
+                title = titles[t]
+                seen = seen_by_title.setdefault(title, set())
+                day = rec[0]  # KR_HEADER[0] = 날짜
+                if day in seen or day == last_of(title):
+                    print(f"Skip duplicate: {t} {rec[2]} @ {day}")
+                    continue
+                pending.setdefault(title, []).append(rec)
+                seen.add(day)
+        except FuturesTimeout:
+            late = [futures[f] for f in futures if not f.done()]
+            print(f"[WARN] 시세 조회 시간 초과({KRX_TIMEOUT:g}s): {late}")
+        finally:
+            ex.shutdown(wait=False, cancel_futures=True)
+
+        # 3) 시트 기록: 새 시트 생성·헤더 정렬·모든 시트의 신규 행·마지막 기록일을 한 번의 API 호출로 기록
+        setup = ensure_sheet_requests(list(pending), KR_HEADER, index)
+        write_rows_batch(sh, pending, index, setup, last_date_requests(pending, index))
+        appended_total = sum(len(rows) for rows in pending.values())
 
         if appended_total == 0:
             print("No records to write.")
         else:
-            print(f"{appended_total}개 행이 추가되었습니다. 대상 거래일: {trade_day.strftime('%Y-%m-%d')}")
+            print(f"{appended_total}개 행이 추가되었습니다. 대상 거래일: {key}")
         return 0
 
     except Exception: